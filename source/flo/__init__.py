@@ -16,6 +16,9 @@ import shutil
 import logging
 import traceback
 from subprocess import CalledProcessError
+from time import time
+
+import numpy as np
 
 from flo.computation import Computation
 from flo.builder import WorkflowNotReady
@@ -29,7 +32,6 @@ from glutil import (
     dawg_catalog,
     delivered_software,
     #support_software,
-    runscript,
     #prepare_env,
     #nc_gen,
     nc_compress,
@@ -42,6 +44,20 @@ import flo.sw.hirs_avhrr as hirs_avhrr
 import flo.sw.hirs_csrb_monthly as hirs_csrb_monthly
 from flo.sw.hirs2nc.delta import DeltaCatalog
 from flo.sw.hirs2nc.utils import link_files
+from flo.sw.hirs_ctp_orbital.mosaic import (
+    bin_orbital_files,
+    write_mosaic,
+    MOSAIC_DATASETS,
+    LATITUDE_NAME,
+    LONGITUDE_NAME
+)
+from flo.sw.hirs_ctp_orbital.utils import filename_to_time_interval
+from flo.sw.hirs_ctp_orbital.contexts import ContextCollection
+from flo.sw.hirs_ctp_orbital.resources import (
+    runscript_with_usage,
+    attach_resource_usage,
+    write_resource_usage
+)
 
 # every module should have a LOG object
 LOG = logging.getLogger(__name__)
@@ -63,15 +79,16 @@ class HIRS_CTP_ORBITAL(Computation):
 
         LOG.debug("Running find_contexts()")
         files = delta_catalog.files('hirs', satellite, 'HIR1B', time_interval)
-        return [{'granule': file.data_interval.left,
-                 'satellite': satellite,
-                 'hirs2nc_delivery_id': hirs2nc_delivery_id,
-                 'hirs_avhrr_delivery_id': hirs_avhrr_delivery_id,
-                 'hirs_csrb_daily_delivery_id': hirs_csrb_daily_delivery_id,
-                 'hirs_csrb_monthly_delivery_id': hirs_csrb_monthly_delivery_id,
-                 'hirs_ctp_orbital_delivery_id': hirs_ctp_orbital_delivery_id}
-                for file in files
-                if file.data_interval.left >= time_interval.left]
+        granules = np.fromiter((file.data_interval.left for file in files), dtype='datetime64[us]')
+        granules = granules[granules >= np.datetime64(time_interval.left, 'us')]
+
+        return ContextCollection(granules,
+                                 satellite=satellite,
+                                 hirs2nc_delivery_id=hirs2nc_delivery_id,
+                                 hirs_avhrr_delivery_id=hirs_avhrr_delivery_id,
+                                 hirs_csrb_daily_delivery_id=hirs_csrb_daily_delivery_id,
+                                 hirs_csrb_monthly_delivery_id=hirs_csrb_monthly_delivery_id,
+                                 hirs_ctp_orbital_delivery_id=hirs_ctp_orbital_delivery_id)
 
     def get_cfsr(self, granule):
         '''
@@ -182,10 +199,11 @@ class HIRS_CTP_ORBITAL(Computation):
         for task_key in task.inputs.keys():
             LOG.debug("\t{}: {}".format(task_key,task.inputs[task_key]))
 
-    def extract_bin_from_cfsr(self, inputs, context):
+    def extract_bin_from_cfsr(self, inputs, context, usage_log):
         '''
         Run wgrib2 on the  input CFSR grib files, to create flat binary files
-        containing the desired data.
+        containing the desired data. The resource usage of the run is appended
+        to usage_log.
         '''
 
         # Where are we running the package
@@ -214,7 +232,7 @@ class HIRS_CTP_ORBITAL(Computation):
         try:
             LOG.debug("cmd = \\\n\t{}".format(cmd.replace(' ',' \\\n\t')))
             rc_extract_cfsr = 0
-            runscript(cmd, [delivery])
+            runscript_with_usage(cmd, [delivery], 'extract_cfsr', context, usage_log)
         except CalledProcessError as err:
             rc_extract_cfsr = err.returncode
             LOG.error("extract_cfsr binary {} returned a value of {}".format(extract_cfsr_bin, rc_extract_cfsr))
@@ -238,18 +256,12 @@ class HIRS_CTP_ORBITAL(Computation):
         covering that file.
         '''
 
-        file_chunks = filename.split('.')
-        begin_time = datetime.strptime('.'.join(file_chunks[3:5]), 'D%y%j.S%H%M')
-        end_time = datetime.strptime('.'.join([file_chunks[3], file_chunks[5]]), 'D%y%j.E%H%M')
+        return filename_to_time_interval(filename)
 
-        if end_time < begin_time:
-            end_time += timedelta(days=1)
-
-        return TimeInterval(begin_time, end_time)
-
-    def create_ctp_orbital(self, inputs, context):
+    def create_ctp_orbital(self, inputs, context, usage_log):
         '''
-        Create the the CTP Orbital for the current granule.
+        Create the the CTP Orbital for the current granule. The resource usage
+        of the run is appended to usage_log.
         '''
 
         rc = 0
@@ -308,7 +320,7 @@ class HIRS_CTP_ORBITAL(Computation):
         try:
             LOG.debug("cmd = \\\n\t{}".format(cmd.replace(' ',' \\\n\t')))
             rc_ctp = 0
-            runscript(cmd, [delivery])
+            runscript_with_usage(cmd, [delivery], 'process_hirs_cfsr', context, usage_log)
         except CalledProcessError as err:
             rc_ctp = err.returncode
             LOG.error(" CTP orbital binary {} returned a value of {}".format(ctp_orbital_bin, rc_ctp))
@@ -338,17 +350,140 @@ class HIRS_CTP_ORBITAL(Computation):
             LOG.debug("run_task() context['{}'] = {}".format(key, context[key]))
 
         rc = 0
+        usage_log = []
+        usage_file = 'hirs_ctp_orbital_resource_usage_{}_{}.json'.format(
+            context['satellite'], context['granule'].strftime('%Y%m%d%H%M'))
+
+        try:
+            # Extract a binary array from a CFSR reanalysis GRIB2 file on a
+            # global equal angle grid at 0.5 degree resolution. CFSR files
+            rc, cfsr_file = self.extract_bin_from_cfsr(inputs, context, usage_log)
+
+            # Link the inputs into the working directory
+            inputs.pop('CFSR')
+            inputs = symlink_inputs_to_working_dir(inputs)
+            inputs['CFSR'] = cfsr_file
+
+            # Create the CTP Orbital for the current granule.
+            rc, ctp_orbital_file = self.create_ctp_orbital(inputs, context, usage_log)
+
+            # Record the resources used by the external executables in the output
+            ctp_orbital_file = nc_compress(ctp_orbital_file)
+            attach_resource_usage(ctp_orbital_file, usage_log)
+        finally:
+            # Keep the resource usage of failed runs too
+            write_resource_usage(usage_file, usage_log)
 
-        # Extract a binary array from a CFSR reanalysis GRIB2 file on a
-        # global equal angle grid at 0.5 degree resolution. CFSR files
-        rc, cfsr_file = self.extract_bin_from_cfsr(inputs, context)
+        return {'out': ctp_orbital_file}
 
-        # Link the inputs into the working directory
-        inputs.pop('CFSR')
-        inputs = symlink_inputs_to_working_dir(inputs)
-        inputs['CFSR'] = cfsr_file
 
-        # Create the CTP Orbital for the current granule.
-        rc, ctp_orbital_file = self.create_ctp_orbital(inputs, context)
+class HIRS_CTP_DAILY_MOSAIC(Computation):
+
+    parameters = ['granule', 'satellite', 'hirs2nc_delivery_id', 'hirs_avhrr_delivery_id',
+                  'hirs_csrb_daily_delivery_id', 'hirs_csrb_monthly_delivery_id',
+                  'hirs_ctp_orbital_delivery_id']
+    outputs = ['out']
+
+    # The orbital datasets to mosaic, and their geolocation
+    datasets = MOSAIC_DATASETS
+    lat_name = LATITUDE_NAME
+    lon_name = LONGITUDE_NAME
+
+    def find_contexts(self, time_interval, satellite, hirs2nc_delivery_id, hirs_avhrr_delivery_id,
+                      hirs_csrb_daily_delivery_id, hirs_csrb_monthly_delivery_id,
+                      hirs_ctp_orbital_delivery_id):
+
+        LOG.debug("Running find_contexts()")
+
+        # One context per day touched by the interval
+        granules = np.arange(np.datetime64(time_interval.left, 'D'),
+                             np.datetime64(time_interval.right, 'D') + 1,
+                             dtype='datetime64[D]')
+
+        return ContextCollection(granules,
+                                 satellite=satellite,
+                                 hirs2nc_delivery_id=hirs2nc_delivery_id,
+                                 hirs_avhrr_delivery_id=hirs_avhrr_delivery_id,
+                                 hirs_csrb_daily_delivery_id=hirs_csrb_daily_delivery_id,
+                                 hirs_csrb_monthly_delivery_id=hirs_csrb_monthly_delivery_id,
+                                 hirs_ctp_orbital_delivery_id=hirs_ctp_orbital_delivery_id)
+
+    @reraise_as(WorkflowNotReady, FileNotFound, prefix='HIRS_CTP_DAILY_MOSAIC')
+    def build_task(self, context, task):
+        '''
+        Build up a set of inputs for a single context
+        '''
+        LOG.debug("Running build_task()")
+
+        wedge = timedelta(seconds=1)
+        day = timedelta(days=1)
+
+        hirs_ctp_orbital_comp = HIRS_CTP_ORBITAL()
+
+        SPC = StoredProductCatalog()
+
+        # Every CTP orbital granule starting within the day
+        interval = TimeInterval(context['granule'], context['granule'] + day - wedge)
+        orbital_contexts = hirs_ctp_orbital_comp.find_contexts(interval, context['satellite'],
+                                                               context['hirs2nc_delivery_id'],
+                                                               context['hirs_avhrr_delivery_id'],
+                                                               context['hirs_csrb_daily_delivery_id'],
+                                                               context['hirs_csrb_monthly_delivery_id'],
+                                                               context['hirs_ctp_orbital_delivery_id'])
+
+        for orbital_context in orbital_contexts:
+            hirs_ctp_orbital_prod = hirs_ctp_orbital_comp.dataset('out').product(orbital_context)
+            if SPC.exists(hirs_ctp_orbital_prod):
+                task.input('CTPO-{}'.format(orbital_context['granule'].strftime('%Y%m%d%H%M')),
+                           hirs_ctp_orbital_prod)
+            else:
+                raise WorkflowNotReady('No HIRS_CTP_ORBITAL inputs available for {}'.format(
+                    orbital_context['granule']))
+
+        if len(task.inputs) == 0:
+            raise WorkflowNotReady('No HIRS_CTP_ORBITAL inputs available for {}'.format(context['granule']))
+
+        LOG.debug("Final task.inputs...")
+        for task_key in task.inputs.keys():
+            LOG.debug("\t{}: {}".format(task_key,task.inputs[task_key]))
+
+    @reraise_as(WorkflowNotReady, FileNotFound, prefix='HIRS_CTP_DAILY_MOSAIC')
+    def run_task(self, inputs, context):
+        '''
+        Bin the day's CTP orbital files onto the mosaic grid
+        '''
+
+        LOG.debug("Running run_task()...")
+
+        for key in context.keys():
+            LOG.debug("run_task() context['{}'] = {}".format(key, context[key]))
+
+        output_file = 'hirs_ctp_daily_mosaic_{}_{}.nc'.format(context['satellite'],
+                                                              context['granule'].strftime('D%y%j'))
+        LOG.info("output_file: {}".format(output_file))
 
-        return {'out': nc_compress(ctp_orbital_file)}
+        # The orbital files are read one at a time, in time order
+        orbital_files = [inputs[key] for key in sorted(inputs.keys())]
+
+        t0 = time()
+        grid, metrics = bin_orbital_files(orbital_files, datasets=self.datasets,
+                                          lat_name=self.lat_name, lon_name=self.lon_name)
+        t1 = time()
+
+        # The binning metrics are stored with the mosaic, the write time is only logged
+        attributes = {'satellite': context['satellite'],
+                      'date': context['granule'].strftime('%Y-%m-%d'),
+                      'hirs_ctp_orbital_delivery_id': context['hirs_ctp_orbital_delivery_id']}
+        attributes.update({'metric_{}'.format(k): v for k, v in metrics.items()})
+        write_mosaic(output_file, grid, attributes=attributes)
+        t2 = time()
+        metrics['write_seconds'] = t2 - t1
+        metrics['total_seconds'] = t2 - t0
+
+        LOG.info("{} {}: binned {} observations from {} files in {:.2f}s "
+                 "(read {:.2f}s, bin {:.2f}s, write {:.2f}s)".format(
+                     context['satellite'], context['granule'].strftime('%Y-%m-%d'),
+                     metrics['observations'], metrics['files'], metrics['total_seconds'],
+                     metrics['read_seconds'], metrics['bin_seconds'], metrics['write_seconds']))
+
+        return {'out': output_file}
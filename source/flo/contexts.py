@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: A compact, read-only collection of hirs_ctp_orbital contexts.
+
+Every context found for an interval shares all of its parameters except the
+granule time, so the shared parameters are stored once and the granule times
+are held in a sorted numpy datetime64 array. The context dicts are only built
+when an item is accessed.
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import logging
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+import numpy as np
+
+from timeutil import datetime
+
+# every module should have a LOG object
+LOG = logging.getLogger(__name__)
+
+
+class ContextCollection(Sequence):
+    '''
+    Sequence of context dicts, made up of the time sorted granules and the
+    parameters common to all of them. Slicing with a positive step returns
+    another ContextCollection, indexing and iteration return context dicts.
+    '''
+
+    def __init__(self, granules, **shared):
+        self.granules = np.sort(np.asarray(granules, dtype='datetime64[us]'))
+        self.shared = shared
+
+    @classmethod
+    def _from_sorted(cls, granules, shared):
+        collection = cls.__new__(cls)
+        collection.granules = granules
+        collection.shared = shared
+        return collection
+
+    def context(self, granule):
+        '''
+        Expand a single datetime64 granule into a context dict.
+        '''
+        # Use the timeutil datetime which the rest of the package builds its
+        # granule contexts from, rather than numpy's plain datetime.datetime.
+        g = granule.astype(object)
+        context = dict(self.shared)
+        context['granule'] = datetime(g.year, g.month, g.day, g.hour, g.minute, g.second,
+                                      g.microsecond)
+        return context
+
+    def __len__(self):
+        return len(self.granules)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            # A reversed slice would break the sort order that searching relies on
+            if idx.step is not None and idx.step < 0:
+                raise ValueError('{} can not be sliced with a negative step'.format(
+                    self.__class__.__name__))
+            return self._from_sorted(self.granules[idx], self.shared)
+        return self.context(self.granules[idx])
+
+    def __iter__(self):
+        for granule in self.granules:
+            yield self.context(granule)
+
+    def __contains__(self, context):
+        try:
+            if any(context[k] != v for k, v in self.shared.items()):
+                return False
+            granule = np.datetime64(context['granule'], 'us')
+        except (KeyError, TypeError, ValueError):
+            return False
+        idx = np.searchsorted(self.granules, granule)
+        return idx < len(self.granules) and self.granules[idx] == granule
+
+    def __repr__(self):
+        if len(self) == 0:
+            return '{}(<empty>, {})'.format(self.__class__.__name__, self.shared)
+        return '{}({} granules from {} to {}, {})'.format(self.__class__.__name__, len(self),
+                                                          self.granules[0], self.granules[-1],
+                                                          self.shared)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: Bin the HIRS CTP orbital retrievals onto a fixed lat/lon grid.
+
+The orbital files are read one at a time, and each is reduced into a set of
+running per-cell sums, counts, minima and maxima, so the memory footprint is
+set by the grid size rather than by the number of orbits in a day.
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import logging
+from time import time
+
+import numpy as np
+from netCDF4 import Dataset
+
+# every module should have a LOG object
+LOG = logging.getLogger(__name__)
+
+# Grid spacing in degrees
+GRID_RESOLUTION = 1.0
+
+# The default geolocation and retrieval datasets read from the orbital files.
+# These are assumed names, not yet checked against a process_hirs_cfsr.exe
+# output; HIRS_CTP_DAILY_MOSAIC exposes them as class attributes to override.
+LATITUDE_NAME = 'Latitude'
+LONGITUDE_NAME = 'Longitude'
+MOSAIC_DATASETS = ['Cloud_Top_Pressure', 'Cloud_Top_Temperature', 'Cloud_Top_Height',
+                   'Cloud_Effective_Emissivity']
+
+FILL_VALUE = -999.
+
+
+class GridAccumulator(object):
+    '''
+    Running mean/count/min/max of a set of datasets on a regular lat/lon grid.
+    '''
+
+    def __init__(self, datasets, resolution=GRID_RESOLUTION):
+
+        self.resolution = float(resolution)
+        self.nlat = int(round(180. / self.resolution))
+        self.nlon = int(round(360. / self.resolution))
+        self.ncells = self.nlat * self.nlon
+        self.datasets = list(datasets)
+
+        self.sum = {}
+        self.count = {}
+        self.min = {}
+        self.max = {}
+        for name in self.datasets:
+            self.sum[name] = np.zeros(self.ncells, dtype=np.float64)
+            self.count[name] = np.zeros(self.ncells, dtype=np.int64)
+            self.min[name] = np.full(self.ncells, np.inf, dtype=np.float64)
+            self.max[name] = np.full(self.ncells, -np.inf, dtype=np.float64)
+
+    @property
+    def latitude(self):
+        return -90. + self.resolution * (np.arange(self.nlat) + 0.5)
+
+    @property
+    def longitude(self):
+        return -180. + self.resolution * (np.arange(self.nlon) + 0.5)
+
+    def cell_index(self, lat, lon):
+        '''
+        Return the flattened grid cell index of each lat/lon pair, and a mask of
+        the pairs which are valid.
+        '''
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90.) & (np.abs(lon) <= 360.)
+
+        row = np.floor((lat[valid] + 90.) / self.resolution).astype(np.int64)
+        np.clip(row, 0, self.nlat - 1, out=row)
+        col = np.floor((lon[valid] + 180.) / self.resolution).astype(np.int64) % self.nlon
+
+        index = np.zeros(lat.shape, dtype=np.int64)
+        index[valid] = row * self.nlon + col
+
+        return index, valid
+
+    def add(self, lat, lon, data):
+        '''
+        Scatter the dict of datasets in "data" (each co-located with lat/lon)
+        into the grid. Returns the number of valid geolocated observations.
+        '''
+        index, valid = self.cell_index(lat, lon)
+
+        for name in self.datasets:
+            if name not in data:
+                continue
+
+            values = np.asarray(data[name], dtype=np.float64).ravel()
+            good = valid & np.isfinite(values)
+            cells = index[good]
+            values = values[good]
+
+            self.sum[name] += np.bincount(cells, weights=values, minlength=self.ncells)
+            self.count[name] += np.bincount(cells, minlength=self.ncells)
+            np.minimum.at(self.min[name], cells, values)
+            np.maximum.at(self.max[name], cells, values)
+
+        return int(valid.sum())
+
+    def statistics(self, name):
+        '''
+        Return the gridded (mean, count, min, max) of dataset "name", with
+        empty cells set to FILL_VALUE.
+        '''
+        shape = (self.nlat, self.nlon)
+        count = self.count[name]
+        empty = count == 0
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum[name] / count
+        minimum = self.min[name].copy()
+        maximum = self.max[name].copy()
+        for arr in (mean, minimum, maximum):
+            arr[empty] = FILL_VALUE
+
+        return (mean.reshape(shape), count.reshape(shape).astype(np.int32),
+                minimum.reshape(shape), maximum.reshape(shape))
+
+
+def read_orbital(filename, datasets, lat_name=LATITUDE_NAME, lon_name=LONGITUDE_NAME):
+    '''
+    Read the geolocation and the requested datasets from a CTP orbital file,
+    with fill values replaced by NaN.
+    '''
+    data = {}
+    with Dataset(filename, 'r') as nc:
+        for name in [lat_name, lon_name]:
+            if name not in nc.variables:
+                raise ValueError('Geolocation dataset "{}" not in {}'.format(name, filename))
+        lat = np.ma.filled(nc.variables[lat_name][:].astype(np.float64), np.nan)
+        lon = np.ma.filled(nc.variables[lon_name][:].astype(np.float64), np.nan)
+        for name in datasets:
+            if name not in nc.variables:
+                LOG.debug('Dataset "{}" not in {}, skipping'.format(name, filename))
+                continue
+            data[name] = np.ma.filled(nc.variables[name][:].astype(np.float64), np.nan)
+
+    return lat, lon, data
+
+
+def bin_orbital_files(filenames, datasets=MOSAIC_DATASETS, resolution=GRID_RESOLUTION,
+                      lat_name=LATITUDE_NAME, lon_name=LONGITUDE_NAME):
+    '''
+    Bin each of the orbital files in turn onto the grid, returning the
+    GridAccumulator and a dictionary of timing metrics.
+
+    Datasets absent from every file are dropped from the mosaic with a warning.
+    Raises ValueError if none of the datasets are found, or if a dataset which
+    is found has no valid observations over all of the files.
+    '''
+    grid = GridAccumulator(datasets, resolution=resolution)
+    metrics = {'files': 0, 'observations': 0, 'read_seconds': 0., 'bin_seconds': 0.}
+    found = set()
+
+    for filename in filenames:
+        t0 = time()
+        lat, lon, data = read_orbital(filename, datasets, lat_name=lat_name, lon_name=lon_name)
+        found.update(data.keys())
+        t1 = time()
+        nobs = grid.add(lat, lon, data)
+        t2 = time()
+
+        LOG.debug('Binned {} observations from {} (read {:.2f}s, bin {:.2f}s)'.format(
+            nobs, filename, t1 - t0, t2 - t1))
+
+        metrics['files'] += 1
+        metrics['observations'] += nobs
+        metrics['read_seconds'] += t1 - t0
+        metrics['bin_seconds'] += t2 - t1
+
+        del lat, lon, data
+
+    absent = [name for name in grid.datasets if name not in found]
+    if absent:
+        LOG.warning('Datasets {} not in any of the {} files, leaving them out of the mosaic'.format(
+            absent, metrics['files']))
+        grid.datasets = [name for name in grid.datasets if name in found]
+    if not grid.datasets:
+        raise ValueError('None of the datasets {} are in the {} files'.format(datasets, metrics['files']))
+
+    empty = [name for name in grid.datasets if grid.count[name].sum() == 0]
+    if empty:
+        raise ValueError('No valid observations of {} in {} files'.format(empty, metrics['files']))
+
+    return grid, metrics
+
+
+def write_mosaic(output_file, grid, attributes=None, complevel=4):
+    '''
+    Write the gridded statistics to a chunked, compressed NetCDF4 file.
+    '''
+    chunks = (min(grid.nlat, 90), min(grid.nlon, 180))
+
+    with Dataset(output_file, 'w', format='NETCDF4') as nc:
+        nc.createDimension('lat', grid.nlat)
+        nc.createDimension('lon', grid.nlon)
+
+        lat = nc.createVariable('lat', 'f4', ('lat',))
+        lat.units = 'degrees_north'
+        lat[:] = grid.latitude
+        lon = nc.createVariable('lon', 'f4', ('lon',))
+        lon.units = 'degrees_east'
+        lon[:] = grid.longitude
+
+        for name in grid.datasets:
+            mean, count, minimum, maximum = grid.statistics(name)
+            for suffix, arr, dtype in [('mean', mean, 'f4'), ('count', count, 'i4'),
+                                       ('min', minimum, 'f4'), ('max', maximum, 'f4')]:
+                # Zero is a valid count, so the counts have no fill value
+                fill = False if dtype == 'i4' else FILL_VALUE
+                var = nc.createVariable('{}_{}'.format(name, suffix), dtype, ('lat', 'lon'),
+                                        zlib=True, complevel=complevel, shuffle=True,
+                                        chunksizes=chunks, fill_value=fill)
+                var[:] = arr
+
+        nc.grid_resolution = grid.resolution
+        for key, value in (attributes or {}).items():
+            setattr(nc, key, value)
+
+    return output_file
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: Lazily read selected variables from the HIRS CTP orbital outputs.
+
+Files are selected by the time stamp in their names, so only the granules
+which overlap the requested interval are ever opened. Only the requested
+variable and scan range is read from each file, one file (or one HDF5 chunk
+of scans) at a time. By default the values are unpacked with scale_factor and
+add_offset, and fill values are returned as NaN.
+
+    >>> from flo.sw.hirs_ctp_orbital.reader import find_files, iter_variable
+    >>> files = find_files('/data/ctp/*/hirs_ctp_orbital_*.nc', interval=interval,
+    ...                    satellite='metop-b')
+    >>> for ctp in iter_variable(files, 'Cloud_Top_Pressure', scans=slice(0, 100)):
+    ...     pass
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import logging
+from os.path import basename
+from glob import glob
+
+import numpy as np
+from netCDF4 import Dataset
+
+from flo.sw.hirs_ctp_orbital.utils import filename_to_time_interval
+
+# every module should have a LOG object
+LOG = logging.getLogger(__name__)
+
+
+def find_files(paths, interval=None, satellite=None):
+    '''
+    Return the time-sorted CTP orbital files from "paths" (a glob pattern or a
+    list of filenames) which overlap "interval" and belong to "satellite".
+    The files are not opened.
+    '''
+    if isinstance(paths, basestring):
+        paths = glob(paths)
+
+    selected = []
+    for filename in paths:
+        if satellite is not None and '_{}_'.format(satellite) not in basename(filename):
+            continue
+        try:
+            file_interval = filename_to_time_interval(filename)
+        except ValueError as err:
+            LOG.debug("{}, skipping".format(err))
+            continue
+        if interval is not None and (file_interval.right < interval.left or
+                                     file_interval.left > interval.right):
+            continue
+        selected.append((file_interval.left, filename))
+
+    return [filename for _, filename in sorted(selected)]
+
+
+def _scan_range(var, scans):
+    '''
+    Return the (start, stop) of the scan slice "scans" for variable "var".
+    '''
+    nscans = var.shape[0]
+    if scans is None:
+        return 0, nscans
+    start, stop, step = scans.indices(nscans)
+    if step != 1:
+        raise ValueError('Only contiguous scan ranges are supported, got step {}'.format(step))
+    return start, max(start, stop)
+
+
+def _block_size(var, block_scans, nscans):
+    '''
+    Return the number of scans to read at a time from variable "var".
+    '''
+    if block_scans == 'chunk':
+        chunking = var.chunking()
+        if chunking == 'contiguous':
+            return max(nscans, 1)
+        return chunking[0]
+    if block_scans is None:
+        return max(nscans, 1)
+    block = int(block_scans)
+    if block < 1:
+        raise ValueError('block_scans must be a positive number of scans, got {}'.format(block_scans))
+    return block
+
+
+def _read_scans(var, first, last, maskandscale):
+    '''
+    Read scans [first, last) of "var", either as the raw stored values or as
+    float64 physical values with the fill values set to NaN.
+    '''
+    if not maskandscale:
+        return var[first:last]
+    return np.ma.filled(np.ma.asarray(var[first:last], dtype=np.float64), np.nan)
+
+
+def _open_variable(nc, name, maskandscale):
+    var = nc.variables[name]
+    var.set_auto_maskandscale(maskandscale)
+    return var
+
+
+def iter_variable(filenames, name, scans=None, block_scans=None, maskandscale=True):
+    '''
+    Yield the contents of variable "name" from each file in turn, as numpy
+    arrays. With "maskandscale" (the default) scale_factor and add_offset are
+    applied and fill values are set to NaN in float64 arrays; otherwise the
+    raw stored values are returned.
+
+    "scans" is a slice along the first (scan) dimension. By default one array
+    is yielded per file; "block_scans" may be an integer number of scans, or
+    'chunk' to read along the variable's HDF5 chunk boundaries, bounding the
+    memory used for long granules.
+    '''
+    for filename in filenames:
+        with Dataset(filename, 'r') as nc:
+            var = _open_variable(nc, name, maskandscale)
+            start, stop = _scan_range(var, scans)
+            block = _block_size(var, block_scans, stop - start)
+            for first in range(start, stop, block):
+                yield _read_scans(var, first, min(first + block, stop), maskandscale)
+
+
+def read_variable(filenames, name, scans=None, maskandscale=True):
+    '''
+    Return variable "name" from all of the files concatenated along the scan
+    dimension, with "maskandscale" as for iter_variable().
+
+    Each file is opened once and read straight into the output array, which is
+    sized from the first file times the number of files, and resized in place
+    if later files are longer, or trimmed at the end if they are shorter.
+    '''
+    filenames = list(filenames)
+
+    data = None
+    offset = 0
+    for filename in filenames:
+        with Dataset(filename, 'r') as nc:
+            var = _open_variable(nc, name, maskandscale)
+            start, stop = _scan_range(var, scans)
+            nscans = stop - start
+            dtype = np.dtype(np.float64) if maskandscale else var.dtype
+
+            if data is None:
+                data = np.empty((nscans * len(filenames),) + var.shape[1:], dtype=dtype)
+            elif var.shape[1:] != data.shape[1:]:
+                raise ValueError('Variable "{}" has shape {} in {}, expected {}'.format(
+                    name, var.shape[1:], filename, data.shape[1:]))
+            elif dtype != data.dtype:
+                data = data.astype(np.promote_types(data.dtype, dtype))
+
+            if offset + nscans > data.shape[0]:
+                data.resize((max(offset + nscans, 2 * data.shape[0]),) + data.shape[1:],
+                            refcheck=False)
+            data[offset:offset + nscans] = _read_scans(var, start, stop, maskandscale)
+            offset += nscans
+
+    if data is None:
+        return np.empty((0,))
+
+    data.resize((offset,) + data.shape[1:], refcheck=False)
+    return data
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: Measure the resources used by the external executables run by the
+hirs_ctp_orbital package, and aggregate them over many products.
+
+Each invocation is run under usage_launcher.py, a small standard library
+script which forks the command itself and reaps it with os.wait4(). The CPU
+time, peak RSS and I/O counters therefore cover the command and its
+descendants only. The peak RSS can't read below the launcher's own few MB, but
+it no longer includes the high-water mark of the flo worker.
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+from os.path import dirname, abspath, exists, join as pjoin
+from time import time
+from subprocess import CalledProcessError
+
+from netCDF4 import Dataset
+
+from glutil import runscript
+
+# every module should have a LOG object
+LOG = logging.getLogger(__name__)
+
+# The launcher script which measures each command
+LAUNCHER = pjoin(dirname(abspath(__file__)), 'usage_launcher.py')
+
+# The name of the global attribute holding the usage records in the outputs
+USAGE_ATTRIBUTE = 'resource_usage'
+
+# The numeric fields of a usage record
+USAGE_FIELDS = ['wall_seconds', 'user_cpu_seconds', 'system_cpu_seconds', 'maxrss_kb',
+                'inblock', 'oublock', 'rchar', 'wchar', 'read_bytes', 'write_bytes']
+
+
+def runscript_with_usage(cmd, deliveries, label, context, usage_log):
+    '''
+    Run "cmd" with runscript() under the usage launcher, appending a usage
+    record for the invocation to "usage_log" whether or not it succeeds. The
+    returncode is recorded as None if the command's exit status is unknown.
+    Any exception from runscript() is reraised.
+    '''
+    record = {'label': label,
+              'satellite': context['satellite'],
+              'delivery_id': context['hirs_ctp_orbital_delivery_id'],
+              'granule': str(context['granule']),
+              'returncode': None}
+
+    fd, usage_file = tempfile.mkstemp(prefix='resource_usage_', suffix='.json', dir=os.getcwd())
+    os.close(fd)
+
+    # -E -S keeps the delivery's environment from affecting the launcher
+    launcher_cmd = '{} -E -S {} {} {}'.format(sys.executable, LAUNCHER, usage_file, cmd)
+
+    t0 = time()
+    try:
+        runscript(launcher_cmd, deliveries)
+        record['returncode'] = 0
+    except CalledProcessError as err:
+        record['returncode'] = err.returncode
+        raise
+    finally:
+        record['wall_seconds'] = time() - t0
+        try:
+            with open(usage_file, 'r') as usage:
+                record.update(json.loads(usage.read()))
+        except (IOError, OSError, ValueError) as err:
+            LOG.warning("No resource usage recorded for {}: {}".format(label, err))
+        finally:
+            if exists(usage_file):
+                os.unlink(usage_file)
+
+        LOG.info("{}: returncode {}, wall {:.1f}s, user {}s, sys {}s, maxrss {} kB, read {} B, write {} B".format(
+            label, record['returncode'], record['wall_seconds'], record.get('user_cpu_seconds'),
+            record.get('system_cpu_seconds'), record.get('maxrss_kb'), record.get('read_bytes'),
+            record.get('write_bytes')))
+        usage_log.append(record)
+
+
+def write_resource_usage(filename, usage_log):
+    '''
+    Log the usage records and save them as a JSON sidecar file, so that they
+    survive runs which fail before producing an output. Failing to write the
+    file is logged rather than raised, so it never masks the run's own error.
+    '''
+    records = json.dumps(usage_log)
+    LOG.info("Resource usage: {}".format(records))
+    try:
+        with open(filename, 'w') as usage_file:
+            usage_file.write(records)
+    except (IOError, OSError) as err:
+        LOG.warning("Unable to write resource usage to {}: {}".format(filename, err))
+        return None
+
+    return filename
+
+
+def attach_resource_usage(filename, usage_log):
+    '''
+    Store the usage records as a JSON global attribute of the NetCDF file.
+    '''
+    with Dataset(filename, 'a') as nc:
+        nc.setncattr(USAGE_ATTRIBUTE, json.dumps(usage_log))
+
+    return filename
+
+
+def read_resource_usage(filename):
+    '''
+    Return the usage records stored in a CTP orbital output, if any.
+    '''
+    with Dataset(filename, 'r') as nc:
+        if USAGE_ATTRIBUTE not in nc.ncattrs():
+            return []
+        return json.loads(nc.getncattr(USAGE_ATTRIBUTE))
+
+
+def aggregate_resource_usage(filenames):
+    '''
+    Summarise the usage records of many CTP orbital outputs, keyed by
+    (satellite, delivery_id, label). Each summary holds the count, and the
+    mean and maximum of each of the USAGE_FIELDS.
+    '''
+    totals = {}
+    for filename in filenames:
+        for record in read_resource_usage(filename):
+            key = (record['satellite'], record['delivery_id'], record['label'])
+            summary = totals.setdefault(key, {'count': 0})
+            summary['count'] += 1
+            for field in USAGE_FIELDS:
+                if field not in record:
+                    continue
+                value = record[field]
+                summary['sum_' + field] = summary.get('sum_' + field, 0) + value
+                summary['n_' + field] = summary.get('n_' + field, 0) + 1
+                summary['max_' + field] = max(summary.get('max_' + field, value), value)
+
+    for summary in totals.values():
+        for field in USAGE_FIELDS:
+            if 'sum_' + field in summary:
+                summary['mean_' + field] = float(summary.pop('sum_' + field)) / summary.pop('n_' + field)
+
+    return totals
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: Run a command and record its resource usage.
+
+    usage_launcher.py <usage_file> <command> [<args> ...]
+
+The command is forked from this small process and reaped with os.wait4(), so
+the rusage covers the command and its descendants only, and its peak RSS is
+not inflated by the high-water mark of a large parent. The I/O counters are
+the difference of /proc/self/io across the command, which includes the reaped
+command's totals. The usage is written to <usage_file> as JSON, and the
+launcher exits with the command's exit status.
+
+Only the standard library is imported, so that this can be run with
+"python -E -S" inside a delivery's environment.
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import os
+import sys
+import json
+from time import time
+
+
+def read_proc_io():
+    '''
+    Return the I/O counters of this process (including reaped children) from
+    /proc/self/io, or an empty dict where that is unavailable.
+    '''
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as io_file:
+            for line in io_file:
+                key, value = line.split(':')
+                counters[key.strip()] = int(value)
+    except (IOError, OSError, ValueError):
+        pass
+
+    return counters
+
+
+def main(argv):
+
+    if len(argv) < 3:
+        sys.stderr.write('Usage: {} <usage_file> <command> [<args> ...]\n'.format(argv[0]))
+        return 2
+
+    usage_file, cmd = argv[1], argv[2:]
+
+    io_before = read_proc_io()
+    t0 = time()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.execvp(cmd[0], cmd)
+        except OSError as err:
+            sys.stderr.write('{}: {}\n'.format(cmd[0], err))
+        finally:
+            os._exit(127)
+
+    _, status, usage = os.wait4(pid, 0)
+    wall_seconds = time() - t0
+    io_after = read_proc_io()
+
+    if os.WIFSIGNALED(status):
+        returncode = 128 + os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+
+    result = {'returncode': returncode,
+              'wall_seconds': wall_seconds,
+              'user_cpu_seconds': usage.ru_utime,
+              'system_cpu_seconds': usage.ru_stime,
+              'maxrss_kb': usage.ru_maxrss,
+              'inblock': usage.ru_inblock,
+              'oublock': usage.ru_oublock}
+    for key in ['rchar', 'wchar', 'read_bytes', 'write_bytes']:
+        if key in io_before and key in io_after:
+            result[key] = io_after[key] - io_before[key]
+
+    with open(usage_file, 'w') as output:
+        output.write(json.dumps(result))
+
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
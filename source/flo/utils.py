@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+
+Purpose: Helper functions shared by the hirs_ctp_orbital modules.
+
+Copyright (c) 2015 University of Wisconsin Regents.
+Licensed under GNU GPLv3.
+"""
+
+import re
+import logging
+from os.path import basename
+
+from timeutil import TimeInterval, datetime, timedelta
+
+# every module should have a LOG object
+LOG = logging.getLogger(__name__)
+
+# Matches the "D%y%j.S%H%M.E%H%M" time stamp common to the HIRS L1B and the
+# CTP orbital filenames.
+granule_time_re = re.compile(r'(D\d{5})\.(S\d{4})\.(E\d{4})')
+
+
+def filename_to_time_interval(filename):
+    '''
+    Takes a HIRS L1B or CTP orbital filename as input and returns the time
+    interval covering that file, without opening it.
+    '''
+
+    match = granule_time_re.search(basename(filename))
+    if match is None:
+        raise ValueError('No granule time stamp in filename "{}"'.format(filename))
+
+    date_str, start_str, end_str = match.groups()
+    begin_time = datetime.strptime('.'.join([date_str, start_str]), 'D%y%j.S%H%M')
+    end_time = datetime.strptime('.'.join([date_str, end_str]), 'D%y%j.E%H%M')
+
+    if end_time < begin_time:
+        end_time += timedelta(days=1)
+
+    return TimeInterval(begin_time, end_time)
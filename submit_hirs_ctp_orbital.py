@@ -134,10 +134,10 @@ try:
         LOG.info("Opening log file {}".format(log_name))
         file_obj = open(log_name,'a')
 
+        # The contexts are returned sorted by granule
         LOG.info("\tThere are {} contexts in this interval".format(len(contexts)))
-        contexts.sort()
 
-        if contexts != []:
+        if len(contexts) != 0:
             #for context in contexts:
                 #LOG.info(context)
 